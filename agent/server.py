@@ -5,6 +5,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from copilotkit.integrations.fastapi import add_fastapi_endpoint
 from copilotkit import CopilotKitRemoteEndpoint, LangGraphAgent
 from agent import math_teacher_graph
+import logging
 import os
 from dotenv import load_dotenv
 
@@ -18,13 +19,16 @@ app = FastAPI(
     version="1.0.0"
 )
 
-# Add CORS middleware
+# Add CORS middleware. Explicit method/header lists (rather than "*")
+# let the browser cache the preflight response, so warm SSE connections
+# to /copilotkit skip the extra preflight round trip.
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["http://localhost:3000", "http://localhost:3001"],  # Next.js dev server
     allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
+    allow_methods=["GET", "POST", "OPTIONS"],
+    allow_headers=["Authorization", "Content-Type", "X-CopilotKit-Runtime-Client-Gql-Version"],
+    max_age=86400,  # cache preflight for 24h
 )
 
 # Initialize the CopilotKit Remote Endpoint
@@ -59,7 +63,11 @@ async def health_check():
 def main():
     """Run the FastAPI server."""
     import uvicorn
-    
+
+    # Agent debug logging is off unless explicitly requested; set
+    # LOG_LEVEL=DEBUG to see the per-turn traces
+    logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper())
+
     # Check for required environment variables
     if not os.getenv("OPENAI_API_KEY"):
         print("⚠️  Warning: OPENAI_API_KEY not found in environment variables")
@@ -68,18 +76,28 @@ def main():
     else:
         print("✅ OPENAI_API_KEY found in environment")
     
+    debug = os.getenv("DEBUG", "0") == "1"
+
     print("🚀 Starting Math Teacher AI Server...")
     print("📚 Available at: http://localhost:8001")
     print("🔗 CopilotKit endpoint: http://localhost:8001/copilotkit")
     print("💡 Health check: http://localhost:8001/health")
-    print("🐛 Debug mode: Enabled (detailed logging active)")
-    
+    if debug:
+        print("🐛 Debug mode: Enabled (auto-reload and detailed logging active)")
+
     uvicorn.run(
         "server:app",
         host="0.0.0.0",
         port=8001,
-        reload=True,
-        log_level="info"
+        # Auto-reload spawns a file watcher plus a forked child; dev only
+        reload=debug,
+        # uvloop + httptools cut per-request event-loop/parsing overhead
+        loop="uvloop",
+        http="httptools",
+        # The checkpointer is in-process, so workers see divergent state;
+        # keep 1 unless a process-safe store is configured
+        workers=1 if debug else int(os.getenv("WEB_CONCURRENCY", "1")),
+        log_level="debug" if debug else "info"
     )
 
 
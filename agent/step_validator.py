@@ -3,11 +3,96 @@ Step-by-step validation service for educational tool interactions.
 Provides intelligent validation and guidance for user learning progression.
 """
 
+import functools
+import sys
+from collections import Counter, deque
+import logging
 import re
 import json
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple, Union
 from datetime import datetime
 from enum import Enum
+from types import MappingProxyType
+
+logger = logging.getLogger(__name__)
+
+
+# Compiled once at import: every validate_* entrypoint parses a problem
+# string, so this is the classic "compile once, match many" pattern.
+_PROBLEM_RE = re.compile(r'(\d+)\s*([+\-×÷*/])\s*(\d+)')
+
+# Unicode operators normalized to their ASCII forms via one dict lookup
+_OP_NORMALIZE = {'×': '*', '÷': '/', '*': '*', '/': '/', '+': '+', '-': '-'}
+
+# Number-line direction per operator, looked up instead of re-branching
+# on every use; anything that is not addition counts backward.
+_STEP = {'+': 1, '-': -1}
+_DIR = {'+': 'forward', '-': 'backward'}
+
+# Calculator keys that count as operators (both ASCII and unicode forms)
+_OPS = frozenset('+-*/×÷')
+
+# Cap on retained validation history; older entries age out so a
+# long-running session cannot grow without bound
+_HISTORY_MAX = 500
+
+# Mistake-type values are compared by equality downstream (insight
+# rules, tool callers) and used as counter keys; interning them makes
+# those comparisons pointer-fast and keeps one shared copy even when
+# equal strings arrive from deserialized payloads.
+_MT_SKIPPING = sys.intern("skipping_numbers")
+_MT_WRONG_DIRECTION = sys.intern("wrong_direction")
+_MT_WRONG_START = sys.intern("wrong_starting_number")
+_MT_INCORRECT_SEQUENCE = sys.intern("incorrect_sequence")
+_MT_NOT_ADDING = sys.intern("not_adding")
+_MT_WRONG_OPERATION = sys.intern("wrong_operation")
+_MT_CLOSE_ANSWER = sys.intern("close_answer")
+_MT_INCORRECT_CALC = sys.intern("incorrect_calculation")
+_MT_INVALID_INPUT = sys.intern("invalid_input")
+_MT_VALIDATION_ERROR = sys.intern("validation_error")
+
+# Insight/recommendation text per observed mistake type; iterating this
+# table keeps get_learning_insights O(rules) as categories accrue.
+_INSIGHT_RULES = {
+    _MT_WRONG_DIRECTION: (
+        "Student sometimes confuses addition and subtraction directions",
+        "Practice more direction awareness exercises"
+    ),
+    _MT_SKIPPING: (
+        "Student tends to skip steps in counting",
+        "Emphasize one-step-at-a-time approach"
+    ),
+}
+
+# Common mistake patterns per operation, frozen at import and shared by
+# every validator instance.
+_COMMON_MISTAKES = MappingProxyType({
+    "addition": (
+        "counting_by_wrong_increment",
+        "starting_from_wrong_number",
+        "going_backward_instead_forward",
+        "skipping_numbers",
+        "adding_instead_of_counting"
+    ),
+    "subtraction": (
+        "going_forward_instead_backward",
+        "subtracting_wrong_amount",
+        "starting_from_wrong_number",
+        "skipping_numbers",
+        "negative_result_confusion"
+    ),
+    "multiplication": (
+        "adding_wrong_groups",
+        "incorrect_grouping",
+        "skip_counting_errors",
+        "repeated_addition_mistakes"
+    ),
+    "division": (
+        "incorrect_grouping",
+        "remainder_confusion",
+        "multiplication_reversal"
+    )
+})
 
 
 class ValidationResult(Enum):
@@ -25,42 +110,241 @@ class ToolType(Enum):
     CALCULATOR = "calculator"
 
 
+# Result strings bound once; saves the enum attribute + .value descriptor
+# walk at every payload construction site.
+_R_CORRECT = ValidationResult.CORRECT.value
+_R_INCORRECT = ValidationResult.INCORRECT.value
+_R_PARTIAL = ValidationResult.PARTIALLY_CORRECT.value
+_R_GUIDE = ValidationResult.NEEDS_GUIDANCE.value
+
+
+def _parse_math_problem(problem) -> Optional[Tuple[int, int, str]]:
+    """Parse a math problem string into components."""
+    if not problem or not isinstance(problem, str):
+        return None
+    return _parse_math_problem_cached(problem.strip())
+
+
+@functools.lru_cache(maxsize=1024)
+def _parse_math_problem_cached(problem: str) -> Optional[Tuple[int, int, str]]:
+    """Memoized parse body; problems repeat across a student session."""
+    # Match patterns like "5 + 3", "10 - 4", etc.
+    match = _PROBLEM_RE.search(problem)
+    
+    if match:
+        first_num = int(match.group(1))
+        operator = _OP_NORMALIZE[match.group(2)]
+        second_num = int(match.group(3))
+        return (first_num, second_num, operator)
+    
+    return None
+
+
+# Constant portions of the result payloads, built once at import. Call
+# sites spread one of these and fill in only the per-call fields, instead
+# of re-storing six constant entries on every return.
+_TMPL_CORRECT_STEP = {
+    "result": _R_CORRECT,
+    "is_correct": True,
+    "mistake_type": None,
+    "guidance_level": "encouraging",
+}
+_TMPL_CELEBRATION = {
+    "result": _R_CORRECT,
+    "is_correct": True,
+    "mistake_type": None,
+    "guidance_level": "celebration",
+}
+_TMPL_WRONG_START = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_WRONG_START,
+    "guidance_level": "specific",
+}
+_TMPL_SKIPPING = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_SKIPPING,
+    "guidance_level": "gentle",
+}
+_TMPL_WRONG_DIRECTION = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_WRONG_DIRECTION,
+    "guidance_level": "specific",
+}
+_TMPL_INCORRECT_SEQUENCE = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_INCORRECT_SEQUENCE,
+    "guidance_level": "helpful",
+}
+_TMPL_NOT_ADDING = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_NOT_ADDING,
+    "guidance_level": "specific",
+}
+_TMPL_WRONG_OPERATION = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_WRONG_OPERATION,
+    "guidance_level": "specific",
+}
+_TMPL_CLOSE_ANSWER = {
+    "result": _R_PARTIAL,
+    "is_correct": False,
+    "mistake_type": _MT_CLOSE_ANSWER,
+    "guidance_level": "encouraging",
+}
+_TMPL_INCORRECT_CALC = {
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "mistake_type": _MT_INCORRECT_CALC,
+}
+# Number-line mistake dispatch, keyed on (operator, sign vs expected
+# next position, sign vs last position). Each entry carries its payload
+# template plus feedback/hint text; the hint is formatted with the
+# expected and proposed positions. Unmapped combinations fall back to
+# the generic wrong-step response.
+_NL_MISTAKES = {
+    ('+', 1, 1): (
+        _TMPL_SKIPPING,
+        "Slow down! Let's count one step at a time.",
+        "Try clicking on {expected} instead of {proposed}."
+    ),
+    ('+', -1, -1): (
+        _TMPL_WRONG_DIRECTION,
+        "For addition, we count forward (to the right)!",
+        "Click on {expected} to continue counting forward."
+    ),
+    ('-', 1, 1): (
+        _TMPL_WRONG_DIRECTION,
+        "For subtraction, we count backward (to the left)!",
+        "Click on {expected} to continue counting backward."
+    ),
+    ('-', -1, -1): (
+        _TMPL_SKIPPING,
+        "Let's count one step at a time.",
+        "Try clicking on {expected} instead of {proposed}."
+    ),
+}
+
+_ERR_BASE = {
+    "result": _R_GUIDE,
+    "is_correct": False,
+    "feedback": "I'm having trouble understanding that step. Let's try again!",
+    "hint": "Take your time and try the next logical step.",
+    "mistake_type": _MT_VALIDATION_ERROR,
+    "guidance_level": "gentle",
+}
+
+# Fully constant payloads: returned as immutable views so the hot
+# rejection/idle paths allocate nothing at all.
+_NEEDS_INPUT_RESULT = MappingProxyType({
+    "result": _R_GUIDE,
+    "is_correct": False,
+    "feedback": "Please enter your answer to continue.",
+    "hint": "Take your time and think about the problem step by step.",
+    "mistake_type": None,
+    "guidance_level": "gentle",
+})
+_INVALID_INPUT_RESULT = MappingProxyType({
+    "result": _R_INCORRECT,
+    "is_correct": False,
+    "feedback": "Please enter a valid number.",
+    "hint": "Make sure you're entering just the number, like '8' or '12'.",
+    "mistake_type": _MT_INVALID_INPUT,
+    "guidance_level": "specific",
+})
+_EMPTY_CALC_RESULT = MappingProxyType({
+    "result": _R_CORRECT,
+    "is_correct": True,
+    "feedback": "Ready to calculate!",
+    "hint": "Enter your first number to get started.",
+    "guidance_level": "gentle",
+})
+_CALC_ON_TRACK_RESULT = MappingProxyType({
+    "result": _R_CORRECT,
+    "is_correct": True,
+    "feedback": "Looking good! Your calculation is on track.",
+    "hint": "Continue with your calculation.",
+    "guidance_level": "encouraging",
+})
+
+
+# Operator dispatch for answer calculation; one dict load and call
+# replaces a four-way comparison chain. Results stay int for +, - and *
+# so callers can compare exactly; only division produces a float.
+_OPS_CALC = {
+    '+': lambda a, b: a + b,
+    '-': lambda a, b: a - b,
+    '*': lambda a, b: a * b,
+    '/': lambda a, b: a / b,
+}
+
+
+def _calculate_answer(first_num: int, second_num: int, operator: str) -> Union[int, float]:
+    """Calculate the correct answer for a math problem."""
+    if operator == '/' and second_num == 0:
+        raise ValueError("Division by zero")
+    try:
+        return _OPS_CALC[operator](first_num, second_num)
+    except KeyError:
+        raise ValueError(f"Unknown operator: {operator}") from None
+
+
+class _ProblemInfo(NamedTuple):
+    """Parsed problem plus its derived values, cached as one record."""
+    first: int
+    second: int
+    op: str
+    answer: Union[int, float]
+    step: int
+
+
+def _problem_info(problem) -> Optional[_ProblemInfo]:
+    """Parse a problem and derive its answer and step sign in one lookup."""
+    if not problem or not isinstance(problem, str):
+        return None
+    return _problem_info_cached(problem.strip())
+
+
+@functools.lru_cache(maxsize=2048)
+def _problem_info_cached(problem: str) -> Optional[_ProblemInfo]:
+    parsed = _parse_math_problem_cached(problem)
+    if not parsed:
+        return None
+    first, second, op = parsed
+    try:
+        answer = _calculate_answer(first, second, op)
+    except ValueError:
+        # Division by zero: treat as unanswerable rather than raising
+        return None
+    return _ProblemInfo(first, second, op, answer, _STEP.get(op, -1))
+
+
 class StepValidator:
     """Main validation service for educational step-by-step interactions."""
     
     def __init__(self):
-        self.validation_history = []
-        self.common_mistakes = self._load_common_mistakes()
+        self.validation_history = deque(maxlen=_HISTORY_MAX)
+        self.mistake_counter = Counter()
+        self.common_mistakes = _COMMON_MISTAKES
     
-    def _load_common_mistakes(self) -> Dict[str, List[str]]:
-        """Load common mistake patterns for different operations."""
-        return {
-            "addition": [
-                "counting_by_wrong_increment",
-                "starting_from_wrong_number", 
-                "going_backward_instead_forward",
-                "skipping_numbers",
-                "adding_instead_of_counting"
-            ],
-            "subtraction": [
-                "going_forward_instead_backward",
-                "subtracting_wrong_amount",
-                "starting_from_wrong_number",
-                "skipping_numbers",
-                "negative_result_confusion"
-            ],
-            "multiplication": [
-                "adding_wrong_groups",
-                "incorrect_grouping",
-                "skip_counting_errors",
-                "repeated_addition_mistakes"
-            ],
-            "division": [
-                "incorrect_grouping",
-                "remainder_confusion",
-                "multiplication_reversal"
-            ]
-        }
+    def _append_history(self, result: Dict[str, Any]) -> None:
+        """Record a result, keeping the live mistake counter in sync."""
+        history = self.validation_history
+        if len(history) == history.maxlen:
+            evicted = history[0].get("mistake_type")
+            if evicted:
+                self.mistake_counter[evicted] -= 1
+                if not self.mistake_counter[evicted]:
+                    del self.mistake_counter[evicted]
+        history.append(result)
+        mistake = result.get("mistake_type")
+        if mistake:
+            self.mistake_counter[sys.intern(mistake)] += 1
     
     def validate_number_line_step(
         self, 
@@ -83,29 +367,23 @@ class StepValidator:
         Returns:
             Validation result with feedback and guidance
         """
-        print(f"🔍 [STEP VALIDATION] Number line: {problem}, steps: {current_steps}, proposed: {proposed_step}")
+        logger.debug("🔍 [STEP VALIDATION] Number line: %s, steps: %s, proposed: %s", problem, current_steps, proposed_step)
         
-        try:
-            # Parse the problem
-            numbers = self._parse_math_problem(problem)
-            if not numbers:
-                return self._create_error_result("Could not parse the math problem")
-            
-            first_num, second_num, operator = numbers
-            
-            # Validate the proposed step
-            if len(current_steps) == 0:
-                # First step validation
-                return self._validate_first_step(first_num, proposed_step, operator)
-            
+        # Parse the problem (one cached record: operands, op, answer)
+        info = _problem_info(problem)
+        if info is None:
+            result = self._create_error_result("Could not parse the math problem")
+        elif len(current_steps) == 0:
+            # First step validation
+            result = self._validate_first_step(info.first, proposed_step, info.op)
+        else:
             # Subsequent step validation
-            return self._validate_subsequent_step(
-                first_num, second_num, operator, current_steps, proposed_step
+            result = self._validate_subsequent_step(
+                info.first, info.second, info.op, current_steps, proposed_step
             )
-            
-        except Exception as e:
-            print(f"❌ [STEP VALIDATION] Error: {str(e)}")
-            return self._create_error_result(f"Validation error: {str(e)}")
+        
+        self._append_history(result)
+        return result
     
     def validate_practice_step(
         self,
@@ -126,61 +404,60 @@ class StepValidator:
         Returns:
             Validation result with feedback
         """
-        print(f"🔍 [PRACTICE VALIDATION] Problem: {problem}, input: {user_input}, step: {step_number}")
+        logger.debug("🔍 [PRACTICE VALIDATION] Problem: %s, input: %s, step: %s", problem, user_input, step_number)
+        
+        result = self._validate_practice(problem, user_input, step_number)
         
+        self._append_history(result)
+        return result
+    
+    def _validate_practice(self, problem: str, user_input: str, step_number: int) -> Dict[str, Any]:
+        """Body of validate_practice_step (split out for history tracking)."""
+        # Parse input safely
+        if not user_input or not user_input.strip():
+            return _NEEDS_INPUT_RESULT
+
+        # Parse as int first (the common case - operands are ints, so
+        # +, - and * results are exact); fall back to float only for
+        # decimal answers to division problems
+        raw = user_input.strip()
         try:
-            # Parse input safely
-            if not user_input or not user_input.strip():
-                return {
-                    "result": ValidationResult.NEEDS_GUIDANCE.value,
-                    "is_correct": False,
-                    "feedback": "Please enter your answer to continue.",
-                    "hint": "Take your time and think about the problem step by step.",
-                    "mistake_type": None,
-                    "guidance_level": "gentle"
-                }
-            
-            # Try to parse as number
+            user_answer = int(raw)
+        except ValueError:
             try:
-                user_answer = float(user_input.strip())
+                user_answer = float(raw)
             except ValueError:
-                return {
-                    "result": ValidationResult.INCORRECT.value,
-                    "is_correct": False,
-                    "feedback": "Please enter a valid number.",
-                    "hint": "Make sure you're entering just the number, like '8' or '12'.",
-                    "mistake_type": "invalid_input",
-                    "guidance_level": "specific"
-                }
-            
-            # Calculate correct answer
-            numbers = self._parse_math_problem(problem)
-            if not numbers:
-                return self._create_error_result("Could not parse the math problem")
-            
-            first_num, second_num, operator = numbers
-            correct_answer = self._calculate_answer(first_num, second_num, operator)
-            
-            # Check if answer is correct
-            if abs(user_answer - correct_answer) < 0.01:
-                return {
-                    "result": ValidationResult.CORRECT.value,
-                    "is_correct": True,
-                    "feedback": f"🎉 Excellent! {problem} = {correct_answer}",
-                    "hint": "Great job! You solved it correctly!",
-                    "mistake_type": None,
-                    "guidance_level": "celebration",
-                    "correct_answer": correct_answer
-                }
-            
-            # Answer is incorrect - analyze the mistake
-            return self._analyze_practice_mistake(
-                first_num, second_num, operator, user_answer, correct_answer, step_number
-            )
-            
-        except Exception as e:
-            print(f"❌ [PRACTICE VALIDATION] Error: {str(e)}")
-            return self._create_error_result(f"Validation error: {str(e)}")
+                user_answer = None
+        if user_answer is None:
+            return _INVALID_INPUT_RESULT
+
+        # Parse the problem; the correct answer rides along in the
+        # cached record
+        info = _problem_info(problem)
+        if info is None:
+            return self._create_error_result("Could not parse the math problem")
+
+        correct_answer = info.answer
+
+        # Check if answer is correct: exact compare for the integer
+        # cases, small tolerance only for float division results
+        if user_answer == correct_answer or (
+            isinstance(correct_answer, float) and abs(user_answer - correct_answer) < 0.01
+        ):
+            return {
+                "result": _R_CORRECT,
+                "is_correct": True,
+                "feedback": f"🎉 Excellent! {problem} = {correct_answer}",
+                "hint": "Great job! You solved it correctly!",
+                "mistake_type": None,
+                "guidance_level": "celebration",
+                "correct_answer": correct_answer
+            }
+
+        # Answer is incorrect - analyze the mistake
+        return self._analyze_practice_mistake(
+            info.first, info.second, info.op, user_answer, correct_answer, step_number
+        )
     
     def validate_calculator_step(
         self,
@@ -199,63 +476,43 @@ class StepValidator:
         Returns:
             Validation result with guidance
         """
-        print(f"🔍 [CALCULATOR VALIDATION] Expression: {expression}, sequence: {operation_sequence}")
+        logger.debug("🔍 [CALCULATOR VALIDATION] Expression: %s, sequence: %s", expression, operation_sequence)
         
-        try:
-            # Basic validation - ensure mathematical correctness
-            if not expression or not expression.strip():
-                return {
-                    "result": ValidationResult.CORRECT.value,
-                    "is_correct": True,
-                    "feedback": "Ready to calculate!",
-                    "hint": "Enter your first number to get started.",
-                    "guidance_level": "gentle"
-                }
-            
+        # Basic validation - ensure mathematical correctness
+        if not expression or not expression.strip():
+            result = _EMPTY_CALC_RESULT
+        else:
             # Check for common calculator mistakes
             mistakes = self._analyze_calculator_sequence(operation_sequence)
-            
             if mistakes:
-                return {
-                    "result": ValidationResult.NEEDS_GUIDANCE.value,
+                result = {
+                    "result": _R_GUIDE,
                     "is_correct": False,
                     "feedback": f"Let's double-check that calculation: {mistakes['feedback']}",
                     "hint": mistakes['hint'],
                     "mistake_type": mistakes['type'],
                     "guidance_level": "helpful"
                 }
-            
-            return {
-                "result": ValidationResult.CORRECT.value,
-                "is_correct": True,
-                "feedback": "Looking good! Your calculation is on track.",
-                "hint": "Continue with your calculation.",
-                "guidance_level": "encouraging"
-            }
-            
-        except Exception as e:
-            print(f"❌ [CALCULATOR VALIDATION] Error: {str(e)}")
-            return self._create_error_result(f"Validation error: {str(e)}")
+            else:
+                result = _CALC_ON_TRACK_RESULT
+        
+        self._append_history(result)
+        return result
     
     def _validate_first_step(self, first_num: int, proposed_step: int, operator: str) -> Dict[str, Any]:
         """Validate the first step in number line interaction."""
         if proposed_step == first_num:
+            step = _STEP.get(operator, -1)
             return {
-                "result": ValidationResult.CORRECT.value,
-                "is_correct": True,
-                "feedback": f"Perfect! You started at {first_num}. Now let's count {'forward' if operator == '+' else 'backward'}!",
-                "hint": f"Great start! Next, click on {first_num + (1 if operator == '+' else -1)}.",
-                "mistake_type": None,
-                "guidance_level": "encouraging"
+                **_TMPL_CORRECT_STEP,
+                "feedback": f"Perfect! You started at {first_num}. Now let's count {_DIR.get(operator, 'backward')}!",
+                "hint": f"Great start! Next, click on {first_num + step}."
             }
         else:
             return {
-                "result": ValidationResult.INCORRECT.value,
-                "is_correct": False,
+                **_TMPL_WRONG_START,
                 "feedback": f"Let's start at the first number: {first_num}",
-                "hint": f"Click on {first_num} to begin the problem.",
-                "mistake_type": "wrong_starting_number",
-                "guidance_level": "specific"
+                "hint": f"Click on {first_num} to begin the problem."
             }
     
     def _validate_subsequent_step(
@@ -267,8 +524,9 @@ class StepValidator:
         proposed_step: int
     ) -> Dict[str, Any]:
         """Validate subsequent steps in number line interaction."""
+        step = _STEP.get(operator, -1)
         last_position = current_steps[-1]
-        expected_next = last_position + (1 if operator == '+' else -1)
+        expected_next = last_position + step
         steps_taken = len(current_steps) - 1  # Subtract 1 because first step is starting position
         
         if proposed_step == expected_next:
@@ -276,25 +534,19 @@ class StepValidator:
             
             if remaining_steps <= 0:
                 # Problem completed!
-                final_answer = first_num + (second_num if operator == '+' else -second_num)
+                final_answer = first_num + step * second_num
                 return {
-                    "result": ValidationResult.CORRECT.value,
-                    "is_correct": True,
+                    **_TMPL_CELEBRATION,
                     "feedback": f"🎉 Fantastic! You solved {first_num} {operator} {second_num} = {final_answer}!",
                     "hint": "Excellent work! You completed the problem step by step.",
-                    "mistake_type": None,
-                    "guidance_level": "celebration",
                     "problem_completed": True,
                     "final_answer": final_answer
                 }
             else:
                 return {
-                    "result": ValidationResult.CORRECT.value,
-                    "is_correct": True,
+                    **_TMPL_CORRECT_STEP,
                     "feedback": f"Great! Keep going - {remaining_steps} more step{'s' if remaining_steps > 1 else ''}.",
-                    "hint": f"Perfect! Now click on {expected_next + (1 if operator == '+' else -1)}.",
-                    "mistake_type": None,
-                    "guidance_level": "encouraging",
+                    "hint": f"Perfect! Now click on {expected_next + step}.",
                     "remaining_steps": remaining_steps
                 }
         else:
@@ -313,61 +565,26 @@ class StepValidator:
     ) -> Dict[str, Any]:
         """Analyze and provide feedback for number line mistakes."""
         
-        # Check if user clicked too far ahead
-        if operator == '+' and proposed_step > expected_next:
-            return {
-                "result": ValidationResult.INCORRECT.value,
-                "is_correct": False,
-                "feedback": f"Slow down! Let's count one step at a time.",
-                "hint": f"Try clicking on {expected_next} instead of {proposed_step}.",
-                "mistake_type": "skipping_numbers",
-                "guidance_level": "gentle"
-            }
-        
-        # Check if user went backward when should go forward
-        elif operator == '+' and proposed_step < last_position:
-            return {
-                "result": ValidationResult.INCORRECT.value,
-                "is_correct": False,
-                "feedback": "For addition, we count forward (to the right)!",
-                "hint": f"Click on {expected_next} to continue counting forward.",
-                "mistake_type": "wrong_direction",
-                "guidance_level": "specific"
-            }
-        
-        # Check if user went forward when should go backward
-        elif operator == '-' and proposed_step > last_position:
-            return {
-                "result": ValidationResult.INCORRECT.value,
-                "is_correct": False,
-                "feedback": "For subtraction, we count backward (to the left)!",
-                "hint": f"Click on {expected_next} to continue counting backward.",
-                "mistake_type": "wrong_direction",
-                "guidance_level": "specific"
-            }
+        # Branchless -1/0/1 signs relative to the expected next position
+        # and to the last position, then one table lookup
+        sign_next = (proposed_step > expected_next) - (proposed_step < expected_next)
+        sign_last = (proposed_step > last_position) - (proposed_step < last_position)
         
-        # Check if user clicked too far back
-        elif operator == '-' and proposed_step < expected_next:
+        entry = _NL_MISTAKES.get((operator, sign_next, sign_last))
+        if entry is not None:
+            template, feedback, hint = entry
             return {
-                "result": ValidationResult.INCORRECT.value,
-                "is_correct": False,
-                "feedback": f"Let's count one step at a time.",
-                "hint": f"Try clicking on {expected_next} instead of {proposed_step}.",
-                "mistake_type": "skipping_numbers",
-                "guidance_level": "gentle"
+                **template,
+                "feedback": feedback,
+                "hint": hint.format(expected=expected_next, proposed=proposed_step)
             }
         
         # Generic incorrect step
-        else:
-            direction = "forward" if operator == '+' else "backward"
-            return {
-                "result": ValidationResult.INCORRECT.value,
-                "is_correct": False,
-                "feedback": f"Not quite! Let's count {direction} one number at a time.",
-                "hint": f"Click on {expected_next} to continue.",
-                "mistake_type": "incorrect_sequence",
-                "guidance_level": "helpful"
-            }
+        return {
+            **_TMPL_INCORRECT_SEQUENCE,
+            "feedback": f"Not quite! Let's count {_DIR.get(operator, 'backward')} one number at a time.",
+            "hint": f"Click on {expected_next} to continue."
+        }
     
     def _analyze_practice_mistake(
         self, 
@@ -380,59 +597,46 @@ class StepValidator:
     ) -> Dict[str, Any]:
         """Analyze practice problem mistakes and provide targeted feedback."""
         
+        # Single exact difference, reused by the close-answer check below
+        diff = user_answer - correct_answer
+        
         # Check for common mistake patterns
         if operator == '+':
             if user_answer == first_num or user_answer == second_num:
                 return {
-                    "result": ValidationResult.INCORRECT.value,
-                    "is_correct": False,
-                    "feedback": f"You entered one of the numbers from the problem. For addition, we need to add them together!",
-                    "hint": f"Try adding {first_num} + {second_num}. What do you get?",
-                    "mistake_type": "not_adding",
-                    "guidance_level": "specific"
+                    **_TMPL_NOT_ADDING,
+                    "feedback": "You entered one of the numbers from the problem. For addition, we need to add them together!",
+                    "hint": f"Try adding {first_num} + {second_num}. What do you get?"
                 }
-            elif abs(user_answer - (first_num - second_num)) < 0.01:
+            elif user_answer == first_num - second_num:
                 return {
-                    "result": ValidationResult.INCORRECT.value,
-                    "is_correct": False,
-                    "feedback": f"It looks like you subtracted instead of adding!",
-                    "hint": f"For addition, we add the numbers together: {first_num} + {second_num}.",
-                    "mistake_type": "wrong_operation",
-                    "guidance_level": "specific"
+                    **_TMPL_WRONG_OPERATION,
+                    "feedback": "It looks like you subtracted instead of adding!",
+                    "hint": f"For addition, we add the numbers together: {first_num} + {second_num}."
                 }
         
         elif operator == '-':
-            if abs(user_answer - (first_num + second_num)) < 0.01:
+            if user_answer == first_num + second_num:
                 return {
-                    "result": ValidationResult.INCORRECT.value,
-                    "is_correct": False,
-                    "feedback": f"It looks like you added instead of subtracting!",
-                    "hint": f"For subtraction, we take away: {first_num} - {second_num}.",
-                    "mistake_type": "wrong_operation",
-                    "guidance_level": "specific"
+                    **_TMPL_WRONG_OPERATION,
+                    "feedback": "It looks like you added instead of subtracting!",
+                    "hint": f"For subtraction, we take away: {first_num} - {second_num}."
                 }
         
         # Check if answer is close (off by small amount)
-        diff = abs(user_answer - correct_answer)
-        if diff <= 2:
+        if -2 <= diff <= 2:
             return {
-                "result": ValidationResult.PARTIALLY_CORRECT.value,
-                "is_correct": False,
+                **_TMPL_CLOSE_ANSWER,
                 "feedback": f"You're very close! The answer is {correct_answer}, you got {user_answer}.",
-                "hint": f"Try again - you're almost there!",
-                "mistake_type": "close_answer",
-                "guidance_level": "encouraging"
+                "hint": "Try again - you're almost there!"
             }
         
         # Generic incorrect answer with guidance
-        guidance_level = "gentle" if step_number == 1 else "specific"
         return {
-            "result": ValidationResult.INCORRECT.value,
-            "is_correct": False,
+            **_TMPL_INCORRECT_CALC,
             "feedback": f"Not quite right. The correct answer is {correct_answer}.",
             "hint": f"Try working through {first_num} {operator} {second_num} step by step.",
-            "mistake_type": "incorrect_calculation",
-            "guidance_level": guidance_level,
+            "guidance_level": "gentle" if step_number == 1 else "specific",
             "correct_answer": correct_answer
         }
     
@@ -443,9 +647,23 @@ class StepValidator:
         if len(operation_sequence) < 2:
             return None  # Not enough operations to analyze
         
-        # Check for repeated operators
-        operators = [op for op in operation_sequence if op in ['+', '-', '*', '/', '×', '÷']]
-        if len(operators) > len(set(operators)) * 2:  # Allow some repetition
+        # One pass over the sequence: count operators, collect the unique
+        # ones and watch for two operators in a row
+        op_count = 0
+        unique_ops = set()
+        prev_was_op = False
+        has_consecutive_operators = False
+        for op in operation_sequence:
+            is_op = op in _OPS
+            if is_op:
+                op_count += 1
+                unique_ops.add(op)
+                if prev_was_op:
+                    has_consecutive_operators = True
+            prev_was_op = is_op
+        
+        # Check for repeated operators (allow some repetition)
+        if op_count > len(unique_ops) * 2:
             return {
                 "type": "repeated_operators",
                 "feedback": "Looks like you entered the same operator multiple times.",
@@ -453,13 +671,6 @@ class StepValidator:
             }
         
         # Check for missing numbers between operators
-        has_consecutive_operators = False
-        for i in range(len(operation_sequence) - 1):
-            if (operation_sequence[i] in ['+', '-', '*', '/', '×', '÷'] and 
-                operation_sequence[i + 1] in ['+', '-', '*', '/', '×', '÷']):
-                has_consecutive_operators = True
-                break
-        
         if has_consecutive_operators:
             return {
                 "type": "consecutive_operators",
@@ -469,56 +680,9 @@ class StepValidator:
         
         return None  # No mistakes detected
     
-    def _parse_math_problem(self, problem: str) -> Optional[Tuple[int, int, str]]:
-        """Parse a math problem string into components."""
-        if not problem or not isinstance(problem, str):
-            return None
-        
-        # Match patterns like "5 + 3", "10 - 4", etc.
-        pattern = r'(\d+)\s*([+\-×÷*/])\s*(\d+)'
-        match = re.search(pattern, problem)
-        
-        if match:
-            first_num = int(match.group(1))
-            operator = match.group(2)
-            second_num = int(match.group(3))
-            
-            # Normalize operator
-            if operator in ['×', '*']:
-                operator = '*'
-            elif operator in ['÷', '/']:
-                operator = '/'
-            
-            return (first_num, second_num, operator)
-        
-        return None
-    
-    def _calculate_answer(self, first_num: int, second_num: int, operator: str) -> float:
-        """Calculate the correct answer for a math problem."""
-        if operator == '+':
-            return float(first_num + second_num)
-        elif operator == '-':
-            return float(first_num - second_num)
-        elif operator == '*':
-            return float(first_num * second_num)
-        elif operator == '/':
-            if second_num == 0:
-                raise ValueError("Division by zero")
-            return float(first_num / second_num)
-        else:
-            raise ValueError(f"Unknown operator: {operator}")
-    
     def _create_error_result(self, error_message: str) -> Dict[str, Any]:
         """Create a standardized error result."""
-        return {
-            "result": ValidationResult.NEEDS_GUIDANCE.value,
-            "is_correct": False,
-            "feedback": "I'm having trouble understanding that step. Let's try again!",
-            "hint": "Take your time and try the next logical step.",
-            "mistake_type": "validation_error",
-            "guidance_level": "gentle",
-            "error": error_message
-        }
+        return {**_ERR_BASE, "error": error_message}
     
     def generate_success_message(self, tool_type: str, problem: str, performance_metrics: Dict[str, Any]) -> str:
         """Generate encouraging success message based on performance."""
@@ -532,31 +696,33 @@ class StepValidator:
         else:
             return f"✅ Well done! You kept trying and solved {problem} successfully!"
     
-    def get_learning_insights(self, validation_history: List[Dict[str, Any]]) -> Dict[str, Any]:
-        """Analyze validation history to provide learning insights."""
-        if not validation_history:
+    def get_learning_insights(self, validation_history: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """Analyze validation history to provide learning insights.
+
+        With no argument, reads the counters maintained by _append_history
+        in O(1) instead of re-scanning a history list.
+        """
+        if validation_history is None:
+            common_mistakes = self.mistake_counter
+            total_validations = len(self.validation_history)
+        else:
+            common_mistakes = Counter(
+                mt for v in validation_history if (mt := v.get("mistake_type"))
+            )
+            total_validations = len(validation_history)
+        if not total_validations:
             return {"insights": [], "recommendations": []}
         
-        mistake_types = [v.get("mistake_type") for v in validation_history if v.get("mistake_type")]
-        common_mistakes = {}
-        for mistake in mistake_types:
-            if mistake:
-                common_mistakes[mistake] = common_mistakes.get(mistake, 0) + 1
-        
         insights = []
         recommendations = []
-        
-        if "wrong_direction" in common_mistakes:
-            insights.append("Student sometimes confuses addition and subtraction directions")
-            recommendations.append("Practice more direction awareness exercises")
-        
-        if "skipping_numbers" in common_mistakes:
-            insights.append("Student tends to skip steps in counting")
-            recommendations.append("Emphasize one-step-at-a-time approach")
+        for mistake_type, (insight, recommendation) in _INSIGHT_RULES.items():
+            if mistake_type in common_mistakes:
+                insights.append(insight)
+                recommendations.append(recommendation)
         
         return {
             "insights": insights,
             "recommendations": recommendations,
-            "mistake_frequency": common_mistakes,
-            "total_validations": len(validation_history)
+            "mistake_frequency": dict(common_mistakes),
+            "total_validations": total_validations
         }
\ No newline at end of file
@@ -1,8 +1,57 @@
 """Math tools for the teacher agent."""
 
 from langchain_core.tools import tool
+import ast
+import asyncio
+import functools
+import logging
 import re
 import operator
+from types import MappingProxyType
+
+from step_validator import StepValidator
+from validators import InputSanitizer, ValidationError, SecurityError
+
+logger = logging.getLogger(__name__)
+
+# Shared sanitizer; its validation patterns are compiled at class level,
+# so one instance serves every call
+_sanitizer = InputSanitizer()
+
+# Shared step validator; it also accumulates mistake history across calls,
+# which per-call instances silently threw away
+_step_validator = StepValidator()
+
+# Whitelisted arithmetic operations for the AST evaluator
+_BINARY_OPS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+}
+_UNARY_OPS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg,
+}
+
+
+@functools.lru_cache(maxsize=1024)
+def _compile_expression(expression: str) -> ast.Expression:
+    """Parse a sanitized arithmetic expression once and cache the AST."""
+    return ast.parse(expression, mode="eval")
+
+
+def _eval_arithmetic(node):
+    """Evaluate a whitelisted arithmetic AST node; reject anything else."""
+    if isinstance(node, ast.Expression):
+        return _eval_arithmetic(node.body)
+    if isinstance(node, ast.Constant) and isinstance(node.value, (int, float)):
+        return node.value
+    if isinstance(node, ast.BinOp) and type(node.op) in _BINARY_OPS:
+        return _BINARY_OPS[type(node.op)](_eval_arithmetic(node.left), _eval_arithmetic(node.right))
+    if isinstance(node, ast.UnaryOp) and type(node.op) in _UNARY_OPS:
+        return _UNARY_OPS[type(node.op)](_eval_arithmetic(node.operand))
+    raise ValueError(f"Unsupported expression element: {type(node).__name__}")
 
 
 @tool
@@ -15,83 +64,93 @@ def calculate(expression: str) -> dict:
     Returns:
         dict: Contains the result, original expression, and explanation
     """
+    # Arithmetic is pure, so identical expressions are served from cache;
+    # callers get a copy in case they mutate the payload
+    return dict(_calculate_cached(expression))
+
+
+@tool
+async def calculate_async(expression: str) -> dict:
+    """Async variant of calculate for non-blocking use in async graphs.
+
+    Args:
+        expression: A mathematical expression like "5 + 3", "10 - 4", "6 * 2", or "8 / 2"
+
+    Returns:
+        dict: Contains the result, original expression, and explanation
+    """
+    # Sanitization and evaluation are CPU-bound; run them off the event loop
+    return dict(await asyncio.to_thread(_calculate_cached, expression))
+
+
+@functools.lru_cache(maxsize=256)
+def _calculate_cached(expression: str) -> MappingProxyType:
+    """Sanitize, evaluate and explain one expression (memoized).
+
+    Returns a read-only mapping so the cached entry cannot be mutated
+    through an escaped reference; the tool wrapper copies it per call.
+    """
     try:
-        # Import the validators here to avoid circular imports
-        from validators import InputSanitizer, ValidationError, SecurityError
-        
         # Use centralized sanitization
-        sanitizer = InputSanitizer()
-        clean_expression = sanitizer.sanitize_math_expression(expression)
+        clean_expression = _sanitizer.sanitize_math_expression(expression)
         
-        # Evaluate the expression safely
-        result = eval(clean_expression)
+        # Evaluate via the cached arithmetic-only AST walker (no eval)
+        result = _eval_arithmetic(_compile_expression(clean_expression))
         
         # Create explanation based on operation
         explanation = _create_explanation(clean_expression, result)
         
-        return {
+        return MappingProxyType({
             "expression": clean_expression,
             "original_expression": expression,
             "result": result,
             "error": None,
             "explanation": explanation
-        }
-        
+        })
+
     except (ValidationError, SecurityError) as e:
-        return {
+        return MappingProxyType({
             "expression": expression,
             "result": None,
             "error": f"Validation error: {str(e)}",
             "explanation": "The expression contains invalid or potentially dangerous content. Please use only numbers and basic math operations (+, -, *, /)."
-        }
+        })
     except ZeroDivisionError:
-        return {
+        return MappingProxyType({
             "expression": expression,
             "result": None,
             "error": "Cannot divide by zero",
             "explanation": "Division by zero is not allowed in mathematics."
-        }
+        })
     except Exception as e:
-        return {
+        return MappingProxyType({
             "expression": expression,
             "result": None,
             "error": f"Error calculating: {str(e)}",
             "explanation": "There was an error with this calculation. Please check the expression."
-        }
+        })
+
+
+# Single binary operation: two numbers around one operator
+_SIMPLE_BINOP_RE = re.compile(r'^\s*(-?\d+(?:\.\d+)?)\s*([+\-*/])\s*(-?\d+(?:\.\d+)?)\s*$')
+
+# Explanation template per operator
+_EXPLANATIONS = {
+    "+": "Adding {num1} and {num2} gives us {result}",
+    "-": "Subtracting {num2} from {num1} gives us {result}",
+    "*": "Multiplying {num1} by {num2} gives us {result}",
+    "/": "Dividing {num1} by {num2} gives us {result}",
+}
 
 
 def _create_explanation(expression: str, result: float) -> str:
     """Create a helpful explanation for the calculation."""
-    
-    # Simple addition
-    if "+" in expression and "-" not in expression:
-        parts = expression.split("+")
-        if len(parts) == 2:
-            num1, num2 = parts[0].strip(), parts[1].strip()
-            return f"Adding {num1} and {num2} gives us {result}"
-    
-    # Simple subtraction
-    elif "-" in expression and "+" not in expression:
-        parts = expression.split("-")
-        if len(parts) == 2:
-            num1, num2 = parts[0].strip(), parts[1].strip()
-            return f"Subtracting {num2} from {num1} gives us {result}"
-    
-    # Simple multiplication
-    elif "*" in expression:
-        parts = expression.split("*")
-        if len(parts) == 2:
-            num1, num2 = parts[0].strip(), parts[1].strip()
-            return f"Multiplying {num1} by {num2} gives us {result}"
-    
-    # Simple division
-    elif "/" in expression:
-        parts = expression.split("/")
-        if len(parts) == 2:
-            num1, num2 = parts[0].strip(), parts[1].strip()
-            return f"Dividing {num1} by {num2} gives us {result}"
-    
-    # Default explanation
+    match = _SIMPLE_BINOP_RE.match(expression)
+    if match:
+        num1, op, num2 = match.groups()
+        return _EXPLANATIONS[op].format(num1=num1, num2=num2, result=result)
+
+    # Default explanation for anything beyond a single binary operation
     return f"The calculation {expression} equals {result}"
 
 
@@ -201,15 +260,11 @@ def validate_learning_step(
         dict: Validation result with feedback, guidance, and correctness information
     """
     try:
-        from step_validator import StepValidator
-        
-        validator = StepValidator()
-        
-        print(f"🔍 [VALIDATION TOOL] Validating {tool_type} step for {problem}")
-        print(f"🔍 [VALIDATION DATA] {validation_data}")
+        logger.debug("Validating %s step for %s", tool_type, problem)
+        logger.debug("Validation data: %s", validation_data)
         
         if tool_type == "number_line":
-            result = validator.validate_number_line_step(
+            result = _step_validator.validate_number_line_step(
                 problem=problem,
                 operation=operation,
                 current_steps=validation_data.get('current_steps', []),
@@ -218,7 +273,7 @@ def validate_learning_step(
             )
         
         elif tool_type == "practice_problem":
-            result = validator.validate_practice_step(
+            result = _step_validator.validate_practice_step(
                 problem=problem,
                 operation=operation,
                 user_input=validation_data.get('user_input', ''),
@@ -226,7 +281,7 @@ def validate_learning_step(
             )
         
         elif tool_type == "calculator":
-            result = validator.validate_calculator_step(
+            result = _step_validator.validate_calculator_step(
                 expression=validation_data.get('expression', ''),
                 operation_sequence=validation_data.get('operation_sequence', []),
                 current_input=validation_data.get('current_input', '')
@@ -242,8 +297,8 @@ def validate_learning_step(
                 "guidance_level": "error"
             }
         
-        print(f"✅ [VALIDATION RESULT] {result.get('result', 'unknown')}: {result.get('feedback', 'No feedback')}")
-        
+        logger.debug("Validation result %s: %s", result.get('result', 'unknown'), result.get('feedback', 'No feedback'))
+
         return {
             "action": "validate_learning_step",
             "tool_type": tool_type,
@@ -253,7 +308,7 @@ def validate_learning_step(
         }
         
     except Exception as e:
-        print(f"❌ [VALIDATION TOOL] Error: {str(e)}")
+        logger.exception("Step validation failed for %s (%s)", problem, tool_type)
         return {
             "action": "validate_learning_step",
             "tool_type": tool_type,
@@ -268,4 +323,28 @@ def validate_learning_step(
                 "error": str(e)
             },
             "message": "Validation completed with fallback guidance"
-        }
\ No newline at end of file
+        }
+
+
+@tool
+async def validate_learning_step_async(
+    tool_type: str,
+    problem: str,
+    operation: str,
+    validation_data: dict
+) -> dict:
+    """Async variant of validate_learning_step for non-blocking use in async graphs.
+
+    Args:
+        tool_type: Type of tool being used ('number_line', 'practice_problem', 'calculator')
+        problem: The math problem being worked on (e.g., '5 + 3')
+        operation: The operation type ('addition', 'subtraction', 'multiplication', 'division')
+        validation_data: Dictionary containing step-specific validation data
+
+    Returns:
+        dict: Validation result with feedback, guidance, and correctness information
+    """
+    # Step validation is CPU-bound; run the sync implementation off the event loop
+    return await asyncio.to_thread(
+        validate_learning_step.func, tool_type, problem, operation, validation_data
+    )
\ No newline at end of file
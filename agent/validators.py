@@ -3,11 +3,14 @@ Centralized validation module for tool responses and user inputs.
 Provides comprehensive validation, sanitization, and security measures.
 """
 
+import functools
 import re
 import json
 import html
+import threading
 import time
-from typing import Dict, Any, Optional, Union, List
+from collections import OrderedDict, deque
+from typing import Dict, Any, Optional, Sequence, Union, List
 from dataclasses import dataclass
 from enum import Enum
 
@@ -30,22 +33,49 @@ class ToolMethod(str, Enum):
     UNKNOWN = "unknown"
 
 
-@dataclass
+# Precomputed value-to-member table; one dict .get replaces both the
+# per-message membership scan and the try/except around ToolMethod()
+_TOOL_METHOD_LOOKUP = {m.value: m for m in ToolMethod}
+
+# Structured completion fields in the order the frontend emits them
+# (see ui/src/utils/validation.ts); one scan extracts all three
+_STRUCT_RE = re.compile(
+    r'\[METHOD:\s*(?P<method>[^\]]+)\]'
+    r'.*?\[ANSWER:\s*(?P<answer>[^\]]+)\]'
+    r'.*?\[PROBLEM:\s*(?P<problem>[^\]]+)\]',
+    re.DOTALL
+)
+
+# Legacy response patterns, compiled once instead of per validated message
+_LEGACY_PATTERNS = [
+    (re.compile(r'solve\s+([^and]+)\s+and got\s+(\d+)', re.IGNORECASE), "visual_interaction"),
+    (re.compile(r'calculator to solve\s+([^and]+)\s+and got\s+([^!]+)', re.IGNORECASE), "calculator"),
+    (re.compile(r'number line.*?(\d+\s*[+\-*/]\s*\d+).*?(\d+)', re.IGNORECASE), "number_line"),
+]
+
+
+@dataclass(slots=True, frozen=True)
 class ValidationResult:
     """Result of validation process."""
     is_valid: bool
     data: Optional[Dict[str, Any]] = None
-    errors: List[str] = None
-    warnings: List[str] = None
-    
-    def __post_init__(self):
-        if self.errors is None:
-            self.errors = []
-        if self.warnings is None:
-            self.warnings = []
+    errors: Sequence[str] = ()
+    warnings: Sequence[str] = ()
+
 
+# Shared rejection results for the hot failure paths; frozen dataclass
+# instances are safe for one instance to serve every rejection
+_RATE_LIMITED_RESULT = ValidationResult(
+    is_valid=False,
+    errors=["Rate limit exceeded. Too many tool calls."]
+)
+_BAD_PREFIX_RESULT = ValidationResult(
+    is_valid=False,
+    errors=["Invalid response format. Expected TOOL_COMPLETION prefix."]
+)
 
-@dataclass
+
+@dataclass(slots=True, frozen=True)
 class ToolResponse:
     """Validated and sanitized tool response data."""
     method: ToolMethod
@@ -69,33 +99,56 @@ class ToolResponse:
 
 class RateLimiter:
     """Simple rate limiter for tool calls."""
-    
+
+    # Cap on tracked sessions so long-running servers don't accumulate
+    # one entry per session id forever
+    MAX_SESSIONS = 1024
+
     def __init__(self, max_calls: int = 10, window_seconds: int = 60):
         self.max_calls = max_calls
         self.window_seconds = window_seconds
-        self.calls = {}  # session_id -> list of timestamps
-    
+        # session_id -> (lock, deque of timestamps, oldest first);
+        # insertion-ordered so the oldest session can be evicted at the cap
+        self.calls = OrderedDict()
+        self._sessions_lock = threading.Lock()
+
+    def _session(self, session_id: str):
+        """Get (or create) the lock/timestamps pair for a session."""
+        try:
+            return self.calls[session_id]
+        except KeyError:
+            # Only session creation takes the shared lock; steady-state
+            # calls touch just their own session's lock
+            with self._sessions_lock:
+                session = self.calls.get(session_id)
+                if session is None:
+                    # Evict the oldest-created sessions once at capacity;
+                    # their windows have almost certainly expired anyway
+                    while len(self.calls) >= self.MAX_SESSIONS:
+                        self.calls.popitem(last=False)
+                    session = (threading.Lock(), deque())
+                    self.calls[session_id] = session
+                return session
+
     def is_allowed(self, session_id: str = "default") -> bool:
         """Check if a call is allowed within rate limits."""
         now = time.time()
-        
-        # Initialize session if new
-        if session_id not in self.calls:
-            self.calls[session_id] = []
-        
-        # Clean old calls outside the window
-        self.calls[session_id] = [
-            timestamp for timestamp in self.calls[session_id]
-            if now - timestamp < self.window_seconds
-        ]
-        
-        # Check if under limit
-        if len(self.calls[session_id]) >= self.max_calls:
-            return False
-        
-        # Record this call
-        self.calls[session_id].append(now)
-        return True
+        lock, timestamps = self._session(session_id)
+        cutoff = now - self.window_seconds
+
+        with lock:
+            # Expire old calls from the front; timestamps are appended in
+            # order, so only the head can be outside the window
+            while timestamps and timestamps[0] <= cutoff:
+                timestamps.popleft()
+
+            # Check if under limit
+            if len(timestamps) >= self.max_calls:
+                return False
+
+            # Record this call
+            timestamps.append(now)
+            return True
 
 
 class InputSanitizer:
@@ -104,23 +157,26 @@ class InputSanitizer:
     # Patterns for potentially malicious content
     SCRIPT_PATTERN = re.compile(r'<script[^>]*>.*?</script>', re.IGNORECASE | re.DOTALL)
     HTML_PATTERN = re.compile(r'<[^>]+>')
-    SQL_INJECTION_PATTERNS = [
-        re.compile(r'\b(SELECT|INSERT|UPDATE|DELETE|DROP|UNION)\b', re.IGNORECASE),
-        re.compile(r'[\'";]\s*(SELECT|INSERT|UPDATE|DELETE|DROP|UNION)', re.IGNORECASE),
-        re.compile(r'--', re.IGNORECASE),  # SQL comments
-        re.compile(r'/\*.*\*/', re.IGNORECASE),  # SQL block comments
-    ]
+    # Single fused alternation; one scan replaces four sequential passes
+    SQL_INJECTION_COMBINED = re.compile(
+        r'\b(?:SELECT|INSERT|UPDATE|DELETE|DROP|UNION)\b'  # SQL keywords
+        r'|[\'";]\s*(?:SELECT|INSERT|UPDATE|DELETE|DROP|UNION)'  # quoted injections
+        r'|--'  # SQL comments
+        r'|/\*.*\*/',  # SQL block comments
+        re.IGNORECASE | re.DOTALL
+    )
     
-    # Mathematical expression validation patterns
-    MATH_PATTERN = re.compile(r'^[\d\s+\-*/()×÷.=?]+$')
+    # Character whitelist for math expressions; str.translate deletes every
+    # allowed character, so anything left over is an invalid character
+    _NON_MATH_CHARS = str.maketrans('', '', '0123456789 \t\n\r\f\v+-*/()×÷.=?')
     
-    # Specific math expression patterns
-    MATH_EQUATION_PATTERNS = [
-        re.compile(r'^\d+\s*[+\-*/×÷]\s*\d+\s*=\s*\?$'),  # "5 + 3 = ?"
-        re.compile(r'^\d+\s*[+\-*/×÷]\s*\d+$'),  # "5 + 3"
-        re.compile(r'^\d+\s*[+\-*/×÷]\s*\d+\s*=\s*\d+$'),  # "5 + 3 = 8"
-        re.compile(r'^\?\s*=\s*\d+\s*[+\-*/×÷]\s*\d+$'),  # "? = 5 + 3"
-    ]
+    # Specific math expression formats fused into one anchored alternation
+    MATH_EQUATION_COMBINED = re.compile(
+        r'^(?:'
+        r'\d+\s*[+\-*/×÷]\s*\d+(?:\s*=\s*(?:\?|\d+))?'  # "5 + 3", "5 + 3 = ?", "5 + 3 = 8"
+        r'|\?\s*=\s*\d+\s*[+\-*/×÷]\s*\d+'  # "? = 5 + 3"
+        r')$'
+    )
     
     @classmethod
     def sanitize_string(cls, text: str, max_length: int = 500) -> str:
@@ -139,37 +195,43 @@ class InputSanitizer:
         text = html.escape(text)
         
         # Check for SQL injection patterns
-        for pattern in cls.SQL_INJECTION_PATTERNS:
-            if pattern.search(text):
-                raise SecurityError("Potentially malicious content detected")
+        if cls.SQL_INJECTION_COMBINED.search(text):
+            raise SecurityError("Potentially malicious content detected")
         
         return text.strip()
     
     @classmethod
     def sanitize_math_expression(cls, expression: str) -> str:
-        """Sanitize mathematical expressions."""
+        """Sanitize mathematical expressions (memoized per expression)."""
         if not isinstance(expression, str):
             raise ValidationError(f"Expected string expression, got {type(expression)}")
-        
+
+        ok, value = _sanitize_math_cached(expression)
+        if ok:
+            return value
+        exc_type, message = value
+        raise exc_type(message)
+
+    @classmethod
+    def _sanitize_math_uncached(cls, expression: str) -> str:
+        """The actual sanitization work behind the memoized entry point."""
         # Length check
         if len(expression) > 100:
             raise ValidationError(f"Expression too long: {len(expression)} > 100")
         
         # Remove scripts (but allow math symbols)
         expression = cls.SCRIPT_PATTERN.sub('', expression)
-        
-        # HTML escape
-        expression = html.escape(expression)
-        
-        # Unescape for math processing
-        expression = html.unescape(expression)
-        
+
+        # No HTML escaping here: the character whitelist below already
+        # rejects <, > and &, so an escape/unescape round trip would be a no-op
+
         # Normalize mathematical operators
         expression = expression.replace("×", "*").replace("÷", "/")
         
-        # First check if it matches any specific math pattern
-        is_valid_math = cls.MATH_PATTERN.match(expression)
-        is_recognized_math_format = any(pattern.match(expression) for pattern in cls.MATH_EQUATION_PATTERNS)
+        # First check the character whitelist (a translate pass is cheaper
+        # than a regex match over the same character class)
+        is_valid_math = expression and not expression.translate(cls._NON_MATH_CHARS)
+        is_recognized_math_format = cls.MATH_EQUATION_COMBINED.match(expression)
         
         if not is_valid_math:
             raise ValidationError(f"Invalid mathematical expression: {expression}")
@@ -177,12 +239,14 @@ class InputSanitizer:
         # If it doesn't match recognized math formats, be more careful about security
         if not is_recognized_math_format:
             # Only check for SQL injection if it doesn't look like a math expression
-            for pattern in cls.SQL_INJECTION_PATTERNS:
-                if pattern.search(expression):
-                    raise SecurityError("Potentially malicious content detected")
+            if cls.SQL_INJECTION_COMBINED.search(expression):
+                raise SecurityError("Potentially malicious content detected")
         
         return expression.strip()
     
+    # Plain integer or decimal, optionally negative
+    _NUMERIC_RE = re.compile(r'^-?\d+(?:\.\d+)?$')
+
     @classmethod
     def sanitize_numeric_answer(cls, answer: Any) -> Union[int, float]:
         """Sanitize and validate numeric answers."""
@@ -191,28 +255,40 @@ class InputSanitizer:
             if abs(answer) > 1000000:  # 1 million limit
                 raise ValidationError(f"Answer out of reasonable bounds: {answer}")
             return answer
-        
+
         if isinstance(answer, str):
-            # Remove whitespace and sanitize
-            answer = cls.sanitize_string(answer, max_length=20).strip()
-            
-            try:
-                if '.' in answer:
-                    result = float(answer)
-                else:
-                    result = int(answer)
-                
-                # Check bounds
-                if abs(result) > 1000000:
-                    raise ValidationError(f"Answer out of reasonable bounds: {result}")
-                
-                return result
-            except ValueError:
+            # Match against the numeric shape up front instead of letting
+            # int()/float() raise on garbage input
+            answer = answer.strip()
+            if not cls._NUMERIC_RE.match(answer):
                 raise ValidationError(f"Cannot convert to number: {answer}")
-        
+
+            result = float(answer) if '.' in answer else int(answer)
+
+            # Check bounds
+            if abs(result) > 1000000:
+                raise ValidationError(f"Answer out of reasonable bounds: {result}")
+
+            return result
+
         raise ValidationError(f"Invalid answer type: {type(answer)}")
 
 
+@functools.lru_cache(maxsize=512)
+def _sanitize_math_cached(expression: str):
+    """Memoize sanitization as an (ok, value) pair.
+
+    Failures are cached as (exception type, message) rather than as the
+    exception instance: re-raising one cached instance would grow its
+    __traceback__ on every hit, pinning ever more frames in memory. The
+    public wrapper raises a fresh exception from the cached pair.
+    """
+    try:
+        return True, InputSanitizer._sanitize_math_uncached(expression)
+    except (ValidationError, SecurityError) as exc:
+        return False, (type(exc), str(exc))
+
+
 class ToolResponseValidator:
     """Validates tool responses from frontend components."""
     
@@ -224,40 +300,32 @@ class ToolResponseValidator:
         """Validate structured tool response format."""
         # Rate limiting check
         if not self.rate_limiter.is_allowed(session_id):
-            return ValidationResult(
-                is_valid=False,
-                errors=["Rate limit exceeded. Too many tool calls."]
-            )
-        
+            return _RATE_LIMITED_RESULT
+
+        return self._validate_structured_nocheck(content)
+
+    def _validate_structured_nocheck(self, content: str) -> ValidationResult:
+        """Structured-format validation without touching the rate limiter."""
+        # Prefix fast path: reject before any regex or sanitization work
+        if not content.startswith("TOOL_COMPLETION:"):
+            return _BAD_PREFIX_RESULT
+
         try:
-            # Check for structured format
-            if not content.startswith("TOOL_COMPLETION:"):
-                return ValidationResult(
-                    is_valid=False,
-                    errors=["Invalid response format. Expected TOOL_COMPLETION prefix."]
-                )
-            
-            # Extract structured data
-            method_match = re.search(r'\[METHOD:\s*([^\]]+)\]', content)
-            answer_match = re.search(r'\[ANSWER:\s*([^\]]+)\]', content)
-            problem_match = re.search(r'\[PROBLEM:\s*([^\]]+)\]', content)
-            
-            if not all([method_match, answer_match, problem_match]):
+            # Extract structured data in one pass
+            match = _STRUCT_RE.search(content)
+            if not match:
                 return ValidationResult(
                     is_valid=False,
                     errors=["Missing required fields: METHOD, ANSWER, or PROBLEM"]
                 )
-            
+
             # Extract and sanitize data
-            method_str = self.sanitizer.sanitize_string(method_match.group(1).strip())
-            answer_str = answer_match.group(1).strip()
-            problem_str = problem_match.group(1).strip()
+            method_str = self.sanitizer.sanitize_string(match.group('method').strip())
+            answer_str = match.group('answer').strip()
+            problem_str = match.group('problem').strip()
             
             # Validate method
-            try:
-                method = ToolMethod(method_str)
-            except ValueError:
-                method = ToolMethod.UNKNOWN
+            method = _TOOL_METHOD_LOOKUP.get(method_str, ToolMethod.UNKNOWN)
             
             # Sanitize problem expression
             try:
@@ -302,31 +370,31 @@ class ToolResponseValidator:
         """Validate legacy response formats for backward compatibility."""
         # Rate limiting check
         if not self.rate_limiter.is_allowed(session_id):
-            return ValidationResult(
-                is_valid=False,
-                errors=["Rate limit exceeded. Too many tool calls."]
-            )
-        
+            return _RATE_LIMITED_RESULT
+
+        return self._validate_legacy_nocheck(content)
+
+    def _validate_legacy_nocheck(self, content: str) -> ValidationResult:
+        """Legacy-format validation without touching the rate limiter."""
         try:
-            # Sanitize content first
-            content = self.sanitizer.sanitize_string(content, max_length=1000)
-            
+            # Bound the regex work; the matched groups are sanitized below,
+            # so a full escape/SQL scan of the whole message is unnecessary
+            if len(content) > 1000:
+                return ValidationResult(
+                    is_valid=False,
+                    errors=[f"Input too long: {len(content)} > 1000"]
+                )
+
             # Try different legacy patterns
-            patterns = [
-                (r'solve\s+([^and]+)\s+and got\s+(\d+)', "visual_interaction"),
-                (r'calculator to solve\s+([^and]+)\s+and got\s+([^!]+)', "calculator"),
-                (r'number line.*?(\d+\s*[+\-*/]\s*\d+).*?(\d+)', "number_line")
-            ]
-            
-            for pattern, method in patterns:
-                match = re.search(pattern, content, re.IGNORECASE)
+            for pattern, method in _LEGACY_PATTERNS:
+                match = pattern.search(content)
                 if match:
                     try:
                         problem = self.sanitizer.sanitize_math_expression(match.group(1).strip())
                         answer = self.sanitizer.sanitize_numeric_answer(match.group(2))
                         
                         tool_response = ToolResponse(
-                            method=ToolMethod(method) if method in [m.value for m in ToolMethod] else ToolMethod.UNKNOWN,
+                            method=_TOOL_METHOD_LOOKUP.get(method, ToolMethod.UNKNOWN),
                             problem=problem,
                             answer=answer,
                             success=True,
@@ -357,6 +425,22 @@ class ToolResponseValidator:
     
     def validate_response(self, message: Any, session_id: str = "default") -> ValidationResult:
         """Main validation entry point for any tool response."""
+        # One rate-limit charge per message, even when the structured
+        # attempt falls back to the legacy path
+        if not self.rate_limiter.is_allowed(session_id):
+            return _RATE_LIMITED_RESULT
+
+        return self._validate_nocheck(message)
+
+    def validate_responses(self, messages: List[Any], session_id: str = "default") -> List[ValidationResult]:
+        """Validate a batch of messages with a single rate-limit charge."""
+        if not self.rate_limiter.is_allowed(session_id):
+            return [_RATE_LIMITED_RESULT for _ in messages]
+
+        return [self._validate_nocheck(message) for message in messages]
+
+    def _validate_nocheck(self, message: Any) -> ValidationResult:
+        """Validate one message without touching the rate limiter."""
         try:
             # Extract content
             if hasattr(message, 'content') and message.content:
@@ -366,24 +450,24 @@ class ToolResponseValidator:
                     is_valid=False,
                     errors=["No content found in message"]
                 )
-            
+
             # Try structured format first
-            result = self.validate_structured_response(content, session_id)
+            result = self._validate_structured_nocheck(content)
             if result.is_valid:
                 return result
-            
+
             # Fall back to legacy format
-            legacy_result = self.validate_legacy_response(content, session_id)
+            legacy_result = self._validate_legacy_nocheck(content)
             if legacy_result.is_valid:
                 return legacy_result
-            
+
             # Both failed
             return ValidationResult(
                 is_valid=False,
-                errors=result.errors + legacy_result.errors,
+                errors=[*result.errors, *legacy_result.errors],
                 warnings=["Multiple validation attempts failed"]
             )
-            
+
         except Exception as e:
             return ValidationResult(
                 is_valid=False,
@@ -391,17 +475,21 @@ class ToolResponseValidator:
             )
 
 
-# Global validator instance
-_validator = None
+# Global validator instance, built eagerly at import time so the first
+# validated message doesn't pay the construction cost (and concurrent
+# first calls can't race to build it twice)
+_validator = ToolResponseValidator()
 
 def get_validator() -> ToolResponseValidator:
     """Get global validator instance."""
-    global _validator
-    if _validator is None:
-        _validator = ToolResponseValidator()
     return _validator
 
 
 def validate_tool_response(message: Any, session_id: str = "default") -> ValidationResult:
     """Convenience function for validating tool responses."""
-    return get_validator().validate_response(message, session_id)
\ No newline at end of file
+    return get_validator().validate_response(message, session_id)
+
+
+def validate_tool_responses(messages: List[Any], session_id: str = "default") -> List[ValidationResult]:
+    """Convenience function for validating a batch of tool responses."""
+    return get_validator().validate_responses(messages, session_id)
\ No newline at end of file